@@ -29,11 +29,19 @@
 # The script uses Retry (from requests.packages.urllib3.util.retry) to mitigate this issue
 #
 from bs4 import BeautifulSoup
-import requests, os, math, datetime, logging, pickle, time, json, telegram, csv, py7zr
+import requests, os, math, datetime, logging, pickle, time, json, telegram, csv, zipfile, hashlib, shutil, re, queue, threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from io import BufferedReader, BytesIO
+from lxml import etree
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from zoneinfo import ZoneInfo
+import zstandard as zstd
 # install telegram with pip3 install python-telegram-bot
+# install zstandard with pip3 install zstandard
 
 # Telegram
 BOT = # Fill in!
@@ -41,31 +49,233 @@ CHAT_ID = # Fill in!
 
 OB_URL = "https://zoek.officielebekendmakingen.nl/"
 REP_URL = "https://repository.overheid.nl/frbr/officielepublicaties/kst/"
+SRU_URL = "https://repository.overheid.nl/sru" # SRU API; compact XML instead of the (heavy, fragile) HTML search results
 PWD = # Fill in!
 RESULTSDIR = f"{PWD}results/"
+CACHE_DIR = f"{PWD}cache/" # downloaded metadata.xml files, keyed by sha1 of the url
 CONFIG_FILE = f"{PWD}dossiernummers-en-zoektermen.json"
-OB_DATE_STRING = "%a, %d %b %Y %H:%M:%S %z"
 LOG_FILE = f"{PWD}dossier-downloader.log"
-STUKKEN_PICKLE_FILE = f"{PWD}dossier-stukken.bin"
+STUKKEN_PICKLE_DIR = f"{PWD}dossier-stukken/" # one pickle shard per dossier, written only when that dossier changed
+LAST_RUN_FILE = f"{PWD}last-run" # empty file; its mtime marks when we last searched for updates
 INFO_PICKLE_FILE = f"{PWD}dossier-info.bin"
+ETAG_FILE = f"{PWD}etags.json" # {url : [etag, last-modified]} for conditional GETs on the mutable endpoints
 MAX_NUM_PER_PAGE = 1000 # max number of results per page (for OB)
+MAX_WORKERS = 12 # number of parallel requests; bounded, as unbounded parallelism triggered RESETs from the server (see notes above)
+FETCH_JITTER = 0.05 # small sleep before each parallel request to spread the load a bit
+
+# one shared pool for the leaf-level request fan-out; spinning up a fresh pool per call pays thread
+# startup every time. The outer per-dossier loops in main() keep their own small local pools on
+# purpose: running those on this pool too could deadlock, as their tasks submit work here themselves.
+FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+# the only thing we need from the OB search result page is the result count in <span class="h1__sub">;
+# a regex grab avoids building the whole DOM (BeautifulSoup stays as fallback in case the markup shifts)
+H1_SUB_RE = re.compile(r'class="h1__sub"[^>]*>([^<]+)<')
 
 LINE_CLEAR = '\x1b[2K' # <-- ANSI sequence to clear the line when using print(string, end='\r') to print multiple strings on the same line (by overwriting the previous string)
 
+# fixed parts of the per-dossier contents.html; built once instead of concatenated per dossier
+HTML_HEADER_START = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+    <meta charset="UTF-8">"""
+HTML_HEADER_END = """
+        <style>
+        table {
+          font-family: verdana, sans-serif;
+          border-collapse: collapse;
+          font-size: 10px;
+        }
+
+        td, th {
+          border: 1px solid #dddddd;
+          text-align: left;
+          padding: 8px;
+        }
+
+        tr:nth-child(even) {
+          background-color: #dddddd;
+        }
+    </style>
+    </head>
+    <body>
+    <table>
+        <thead>
+            <tr>
+                <th>Datum</th>
+                <th>Stuk</th>
+                <th>Vergaderjaar</th>
+                <th>Organisatie</th>
+                <th>Titel</th>
+                <th>Bijlage(n)</th>
+            </tr>
+        </thead>
+        <tbody>
+"""
+HTML_FOOTER = """
+        </tbody>
+    </table>
+    </body>
+    </html>
+"""
+
 # for making 'requests' more robust
+# 429 included so rate-limit responses back off too; respect_retry_after_header makes urllib3
+# sleep exactly as long as the server's Retry-After asks (instead of a worst-case guess),
+# falling back to its own exponential backoff when the header is absent
 retry_strategy = Retry(
     total=8,
     backoff_factor=1,
-    status_forcelist=[500, 502, 503, 504],
+    status_forcelist=[429, 500, 502, 503, 504],
+    respect_retry_after_header=True,
     allowed_methods=["HEAD", "GET", "OPTIONS"]
 )
-adapter = HTTPAdapter(max_retries=retry_strategy)
+# pool large enough for MAX_WORKERS parallel requests; pool_block makes workers wait for a warm
+# keep-alive connection instead of opening (and immediately discarding) extra ones, so the TLS
+# handshake is paid once per pooled connection instead of once per request
+adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, pool_block=True, max_retries=retry_strategy)
 http = requests.Session()
 http.headers.update({'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:103.0) Gecko/20100101 Firefox/103.0'})
 http.mount("https://", adapter)
+http.mount("http://", adapter) # so redirects via plain http reuse the same pool
 
 logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s: %(levelname)s: %(message)s')
 
+notify_q = queue.Queue()
+
+def notifier():
+    # single background worker talks to Telegram; the anti-flood delay happens here,
+    # off the critical path, instead of stalling downloads for 2s per message
+    while True:
+        text = notify_q.get()
+        try:
+            BOT.sendMessage(chat_id=CHAT_ID, text=text)
+        except Exception:
+            logging.exception(f"Kan Telegram-bericht niet versturen: {text}")
+        notify_q.task_done()
+        time.sleep(2) # Telegram does not like too many messages within a short timeframe
+
+threading.Thread(target=notifier, daemon=True).start()
+
+def notify(text):
+    notify_q.put(text)
+
+def archive_dossier(dossier_nr):
+    # append-only archive: PDFs are already compressed, so store them uncompressed (no LZMA/deflate CPU)
+    # and only add files that are new or changed instead of recompressing the whole dossier every time.
+    # An updated file (contents.html) gets a second entry; extractors keep the newest one.
+    directory = f"{RESULTSDIR}{dossier_nr}"
+    with zipfile.ZipFile(f"{RESULTSDIR}{dossier_nr}.zip", 'a', compression=zipfile.ZIP_STORED) as archive:
+        present = {info.filename : info.file_size for info in archive.infolist()}
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".tmp"): # sidecar left by an interrupted download; not a real stuk
+                continue
+            arcname = f"{dossier_nr}/{filename}"
+            if present.get(arcname) != os.path.getsize(f"{directory}/{filename}"):
+                archive.write(f"{directory}/{filename}", arcname)
+
+def dump_pickle(obj, path):
+    # pickles are full of repetitive strings (urls, titles); zstd shrinks them 5-10x, which also speeds up cold loads
+    # write to a sidecar first and switch with an atomic rename, so a crash mid-dump leaves the
+    # previous pickle intact instead of corrupting it (which would force a full re-crawl next run)
+    with open(f"{path}.tmp", 'wb') as f, zstd.ZstdCompressor(level=3).stream_writer(f) as writer:
+        pickle.dump(obj, writer, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{path}.tmp", path)
+
+def dump_dossier(dossier):
+    os.makedirs(STUKKEN_PICKLE_DIR, exist_ok=True)
+    dump_pickle(dossier, f"{STUKKEN_PICKLE_DIR}{dossier.nr}.pkl")
+
+def load_pickle(path):
+    with open(path, 'rb') as f, zstd.ZstdDecompressor().stream_reader(f) as reader:
+        # buffer the decompressed stream; pickle reads it in many small chunks
+        return pickle.load(BufferedReader(reader))
+
+try:
+    with open(ETAG_FILE) as f:
+        etags = json.load(f)
+except (FileNotFoundError, json.JSONDecodeError):
+    etags = {}
+
+def save_etags():
+    # same sidecar-then-rename as dump_pickle; a truncated etags file would silently disable all conditional GETs
+    with open(f"{ETAG_FILE}.tmp", 'w') as f:
+        json.dump(etags, f)
+    os.replace(f"{ETAG_FILE}.tmp", ETAG_FILE)
+
+def conditional_get(url):
+    # for mutable endpoints (RSS feeds, dossier overviews): send the validators from the previous
+    # response, so the server can answer 304 Not Modified (a few bytes) instead of the full payload
+    key = hashlib.sha1(url.encode()).hexdigest()
+    body_path = f"{CACHE_DIR}{key}.body"
+    headers = {}
+    etag, last_modified = etags.get(url, (None, None))
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    if headers and os.path.exists(body_path):
+        response = http.get(url, headers=headers)
+        if response.status_code == 304:
+            with open(body_path, 'rb') as f:
+                return f.read()
+    else:
+        response = http.get(url)
+    etags[url] = [response.headers.get('ETag'), response.headers.get('Last-Modified')]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(body_path, 'wb') as f:
+        f.write(response.content)
+    return response.content
+
+def cached_get(url):
+    # metadata.xml of historical stukken never changes, so keep a copy on disk and skip the HTTPS roundtrip on re-runs
+    # use conditional_get for mutable endpoints (RSS, overviews) instead
+    key = hashlib.sha1(url.encode()).hexdigest()
+    path = f"{CACHE_DIR}{key}.xml"
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    response = http.get(url)
+    if response.status_code == 200:
+        # only cache successful bodies: a transient 404/403 (e.g. a stuk polled right as it is
+        # published) must not become that url's metadata forever -- there is no invalidation path.
+        # sidecar + os.replace so a crash mid-write never leaves a truncated cache entry behind
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(response.content)
+        os.replace(f"{path}.tmp", path)
+    return response.content
+
+def parse_metadata(content):
+    # single SAX-style pass over metadata.xml instead of building a full soup tree per document
+    # returns {name/scheme : [content, ...]}; lists because some names (e.g. OVERHEIDop.bijlage) occur more than once
+    meta = {}
+    try:
+        for _, element in etree.iterparse(BytesIO(content), events=('end',), tag='metadata'):
+            for attribute in ('name', 'scheme'):
+                key = element.get(attribute)
+                if key:
+                    meta.setdefault(key, []).append(element.get('content'))
+            element.clear()
+    except etree.XMLSyntaxError:
+        logging.warning("Kan metadata.xml niet parsen")
+    return meta
+
+@lru_cache(maxsize=4096)
+def parse_date(date_str):
+    # strptime re-parses the format spec on every call and many stukken share the same date, so memoize
+    return datetime.datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=ZoneInfo('localtime'))
+
+@lru_cache(maxsize=10000)
+def get_meta(url):
+    # in-process memo on top of the disk cache: bijlagen referenced from multiple kamerstukken are
+    # fetched and parsed once per run; lru_cache is thread-safe, so this composes with the thread pools
+    # note: callers must not mutate the returned dict
+    return parse_metadata(cached_get(url))
+
 class Dossier_info():
     def __init__(self, nr):
         self.nr = nr
@@ -87,7 +297,7 @@ class Dossier:
     def __init__(self, nr, search_terms):
         self.nr = nr
         self.search_terms = search_terms
-        self.obs = set()
+        self.obs = {} # {nr : Bekendmaking}; keyed by nr so lookups and dedup don't rely on hashing the objects
 
     def add_rep_kamerstukken(self):
         start = 1
@@ -112,72 +322,39 @@ class Dossier:
         #print(end=LINE_CLEAR)
         #print(f"Processing {len(all_works)} links to Kamerstukken")
         
-        for i, work in enumerate(all_works):
-            kst = Kamerstuk()
-            kst.add_info(f"{REP_URL}{self.nr}/{work}/1/metadata/metadata.xml")
+        # metadata fetches are independent, so fan them out over the shared (pooled) session
+        for kst in FETCH_EXECUTOR.map(self._fetch_kst, all_works):
             if kst.date_str:
-                self.obs.add(kst)
+                self.obs[kst.nr] = kst
 
         #print(end=LINE_CLEAR)
         #print(f"Retrieved {len(self.obs)} Kamerstuk(ken) for dossier {self.nr} from {REP_URL}")
 
+    def _fetch_kst(self, work):
+        time.sleep(FETCH_JITTER)
+        kst = Kamerstuk()
+        kst.add_info(f"{REP_URL}{self.nr}/{work}/1/metadata/metadata.xml")
+        # fetch the bijlagen titles right here, while this worker already holds the kamerstuk;
+        # one fused pass over the pool instead of a separate title pass over all obs afterwards.
+        # parallel=False because this task already runs on FETCH_EXECUTOR (see add_bijlagen_titles)
+        kst.add_bijlagen_titles(parallel=False)
+        return kst
+
     def write_html(self):
         if len(self.obs) == 0:
             #print(f"No Kamerstukken or Staatsblad publications found for dossier {self.nr}")
             logging.warning(f"No Kamerstukken or Staatsblad publications found for dossier {self.nr}")
         else:
-            html = """
-                <!DOCTYPE html>
-                <html>
-                <head>
-                <meta charset="UTF-8">"""
-            html += f"<title>{self.nr}</title>"
-            html += """
-                    <style>
-                    table {
-                      font-family: verdana, sans-serif;
-                      border-collapse: collapse;
-                      font-size: 10px;
-                    }
-
-                    td, th {
-                      border: 1px solid #dddddd;
-                      text-align: left;
-                      padding: 8px;
-                    }
-
-                    tr:nth-child(even) {
-                      background-color: #dddddd;
-                    }
-                </style>
-                </head>
-                <body>
-                <table>
-                    <thead>
-                        <tr>
-                            <th>Datum</th>
-                            <th>Stuk</th>
-                            <th>Vergaderjaar</th>
-                            <th>Organisatie</th>
-                            <th>Titel</th>
-                            <th>Bijlage(n)</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-            """
-            obs_list = list(self.obs)
+            obs_list = list(self.obs.values())
             obs_list.sort(key=lambda x: x.date_str, reverse=True)
-            for obs in obs_list:
-                html += '\n'.join(obs.get_html_list())
-            html +="""
-                    </tbody>
-                </table>
-                </body>
-                </html>
-            """
-
+            # write each chunk directly instead of concatenating one giant string first
             with open(f'{RESULTSDIR}{self.nr}/contents.html', 'w') as f:
-                f.write(html)
+                f.write(HTML_HEADER_START)
+                f.write(f"<title>{self.nr}</title>")
+                f.write(HTML_HEADER_END)
+                for obs in obs_list:
+                    f.write('\n'.join(obs.get_html_list()))
+                f.write(HTML_FOOTER)
 
 class Bekendmaking:# super-class for Kamerstuk and Stb_pub
 
@@ -218,14 +395,32 @@ class Bekendmaking:# super-class for Kamerstuk and Stb_pub
         ]
         
     def dowload_all(self, dossier_nr):
-        self.download_file(self.nr, f"{self.date_str}-{self.nr}.pdf", dossier_nr)
-        for bijlage_nr in self.bijlagen_dict.keys():
-            self.download_file(bijlage_nr, f"{self.date_str}-{self.nr}-{bijlage_nr}.pdf", dossier_nr)
-    
+        downloads = [(self.nr, f"{self.date_str}-{self.nr}.pdf")]
+        for bijlage_nr in self.bijlagen_dict:
+            downloads.append((bijlage_nr, f"{self.date_str}-{self.nr}-{bijlage_nr}.pdf"))
+        # PDFs of the stuk and its bijlagen can download in parallel
+        list(FETCH_EXECUTOR.map(lambda download: self.download_file(download[0], download[1], dossier_nr), downloads))
+
     def download_file(self, nr, filename, dossier_nr):
-        response = http.get(f"{OB_URL}{nr}.pdf")
-        with open(f"{RESULTSDIR}{dossier_nr}/{filename}", 'wb') as f:
-            f.write(response.content)
+        path = f"{RESULTSDIR}{dossier_nr}/{filename}"
+        try:
+            if os.path.getsize(path) > 0: # already downloaded on a previous run
+                return
+        except OSError:
+            pass
+        # stream to disk in chunks instead of buffering the whole PDF in memory; stream into a
+        # sidecar and rename on success, so a connection dropped mid-copy (this server does that,
+        # see notes above) cannot leave a truncated PDF that later runs skip as already downloaded
+        with http.get(f"{OB_URL}{nr}.pdf", stream=True) as response:
+            if response.status_code != 200:
+                # e.g. a 404 for a stuk polled right as it is published; keeping the error page would
+                # make the skip-guard above treat it as downloaded forever -- retry next run instead
+                logging.warning(f"Kan {OB_URL}{nr}.pdf niet downloaden: status {response.status_code}")
+                return
+            with open(f"{path}.tmp", 'wb') as f:
+                response.raw.decode_content = True # decode gzip/deflate transfer encoding while copying, like response.content would
+                shutil.copyfileobj(response.raw, f, length=65536)
+        os.replace(f"{path}.tmp", path)
 
 class Kamerstuk(Bekendmaking):
 
@@ -237,6 +432,7 @@ class Kamerstuk(Bekendmaking):
         self.organisatie = None
         self.bijlagen_dict = {}
         self.dossier_nr_string = None
+        self.dossier_nrs = () # parsed once from dossier_nr_string; ordered, as the first nr is the leading dossier
         self.ondernummer_string = None
         
         #print(end=LINE_CLEAR)
@@ -244,90 +440,89 @@ class Kamerstuk(Bekendmaking):
 
     def add_info(self, metadata_link):
         #response = http.get(urllib.parse.unquote(metadata_link)) # urllib.parse.unquote to fix strange utf-8 issues...
-        response = http.get(metadata_link)
-        #response.encoding = 'UTF-8' # to fix decoding issues; did not work out here, used response.content instead...
-        soup = BeautifulSoup(response.content, 'xml')
+        meta = get_meta(metadata_link)
         try:
-            doc_type = soup.find("metadata", {"scheme" : "OVERHEIDop.Parlementair"})['content']
-        except TypeError:
+            doc_type = meta["OVERHEIDop.Parlementair"][0]
+        except KeyError:
             #print(f"No DC.type found in {metadata_link}")
             logging.warning(f"No OVERHEIDop.Parlementair found in {metadata_link}")
         else:
             if doc_type != "Kamerstuk": # only proceed when doc_type is Kamerstuk
                 if doc_type != "Bijlage":
                     #print(end=LINE_CLEAR)
-                    #print(f"{metadata_link}: DC.type is {type}")
-                    logging.warning(f"{metadata_link}: DC.type is {type}")
+                    #print(f"{metadata_link}: DC.type is {doc_type}")
+                    logging.warning(f"{metadata_link}: DC.type is {doc_type}")
             #if doc_type == "Kamerstuk": # only proceed when doc_type is Kamerstuk
-            else: 
+            else:
                 self.nr = metadata_link.split("/")[-2] # works when metadata_link refers to {OB_URL}:
                 if self.nr == "metadata": # apparently, metadata_link refers to {REP_URL}:
                     self.nr = metadata_link.split("/")[-4]
                 try:
-                    self.ondernummer_string = soup.find("metadata", {"name" : "OVERHEIDop.ondernummer"})['content']
-                except TypeError:
+                    self.ondernummer_string = meta["OVERHEIDop.ondernummer"][0]
+                except KeyError:
                     self.ondernummer_string = self.nr.split("-")[-1]
                 try:
-                    self.dossier_nr_string = soup.find("metadata", {"name" : "OVERHEIDop.dossiernummer"})['content']
-                except TypeError:
+                    self.dossier_nr_string = meta["OVERHEIDop.dossiernummer"][0]
+                    self.dossier_nrs = tuple(self.dossier_nr_string.split(";"))
+                except KeyError:
                     #print(f"No OVERHEIDop.dossiernummer found in {metadata_link}")
                     logging.warning(f"No OVERHEIDop.dossiernummer found in {metadata_link}")
                 else:
-                    self.date_str = soup.find("metadata", {"name" : "DCTERMS.available"})['content']
+                    self.date_str = meta["DCTERMS.available"][0]
                     try:
-                        self.title = soup.find("metadata", {"name" : "OVERHEIDop.documenttitel"})['content']
-                    except TypeError:
-                        self.title = soup.find("metadata", {"name" : "DC.title"})['content'].split(";")[-1].strip()
-                    self.vergaderjaar = soup.find("metadata", {"name" : "OVERHEIDop.vergaderjaar"})['content']
-                    self.organisatie = soup.find("metadata", {"name" : "DC.creator"})['content']
+                        self.title = meta["OVERHEIDop.documenttitel"][0]
+                    except KeyError:
+                        self.title = meta["DC.title"][0].split(";")[-1].strip()
+                    self.vergaderjaar = meta["OVERHEIDop.vergaderjaar"][0]
+                    self.organisatie = meta["DC.creator"][0]
 
         # try to add regular bijlagen
-        try:
-            bijlagen = soup.find_all("metadata", {"name" : "OVERHEIDop.bijlage"})
-            for bijlage in bijlagen:
-                if not bijlage['content'] in self.bijlagen_dict.keys():
-                    self.bijlagen_dict[bijlage['content']] = None
-        except AttributeError:
-            pass
-            
+        for bijlage in meta.get("OVERHEIDop.bijlage", []):
+            if not bijlage in self.bijlagen_dict:
+                self.bijlagen_dict[bijlage] = None
+
         # try to add old bijlagen
-        try:
-            bijlagen = soup.find_all("metadata", {"name" : "DCTERMS.relation"})
-            for bijlage in bijlagen:
-                bijlage_nr = bijlage['content'].split(";")[-1].strip()
-                if not bijlage_nr in self.bijlagen_dict.keys():
-                    self.bijlagen_dict[bijlage_nr] = None
-        except AttributeError:
-            pass
+        for bijlage in meta.get("DCTERMS.relation", []):
+            bijlage_nr = bijlage.split(";")[-1].strip()
+            if not bijlage_nr in self.bijlagen_dict:
+                self.bijlagen_dict[bijlage_nr] = None
 
         # try to add replacement Kamerstukken (-h1) as bijlagen
+        for bijlage in meta.get("DCTERMS.isReplacedBy", []):
+            bijlage_nr = bijlage.split(";")[-1].strip()
+            if not bijlage_nr in self.bijlagen_dict:
+                self.bijlagen_dict[bijlage_nr] = None
+
+    def add_bijlagen_titles(self, parallel=True):
+        # titles persist in bijlagen_dict via the pickle shard, so on incremental runs most
+        # kamerstukken have nothing left to fetch; bail out before touching the executor
+        todo = [bijlage_nr for bijlage_nr in self.bijlagen_dict if self.bijlagen_dict[bijlage_nr] == None]
+        if not todo:
+            return
+        if parallel:
+            results = FETCH_EXECUTOR.map(self._fetch_bijlage_title, todo)
+        else:
+            # for callers that already run on FETCH_EXECUTOR themselves: submitting back to the
+            # same pool from inside one of its tasks can deadlock, so fetch serially in-task
+            results = map(self._fetch_bijlage_title, todo)
+        for bijlage_nr, bijlage_title in results:
+            if bijlage_title:
+                self.bijlagen_dict[bijlage_nr] = bijlage_title
+
+    def _fetch_bijlage_title(self, bijlage_nr):
+        time.sleep(FETCH_JITTER)
         try:
-            bijlagen = soup.find_all("metadata", {"name" : "DCTERMS.isReplacedBy"})
-            for bijlage in bijlagen:
-                bijlage_nr = bijlage['content'].split(";")[-1].strip()
-                if not bijlage_nr in self.bijlagen_dict.keys():
-                    self.bijlagen_dict[bijlage_nr] = None
-        except AttributeError:
-            pass
-
-    def add_bijlagen_titles(self):
-        for bijlage_nr in self.bijlagen_dict.keys():
-            if self.bijlagen_dict[bijlage_nr] == None:
-                try:
-                    bijlage_response = http.get(f"{OB_URL}{bijlage_nr}/metadata.xml")
-                    bijlage_response.encoding = 'UTF-8' # to fix decoding issues
-                    bijlage_soup = BeautifulSoup(bijlage_response.text, 'xml')
-                    bijlage_title = bijlage_soup.find("metadata", {"name" : "DC.title"})['content']
-                    self.bijlagen_dict[bijlage_nr] = bijlage_title
-                except TypeError:
-                    logging.warning(f"Geen DC.title voor bijlage in {OB_URL}{bijlage_nr}/metadata.xml")
+            meta = get_meta(f"{OB_URL}{bijlage_nr}/metadata.xml")
+            return bijlage_nr, meta["DC.title"][0]
+        except KeyError:
+            logging.warning(f"Geen DC.title voor bijlage in {OB_URL}{bijlage_nr}/metadata.xml")
+            return bijlage_nr, None
 
     @property
     def date(self):
         if self.date_str:
-            date = datetime.datetime.strptime(self.date_str, "%Y-%m-%d").replace(tzinfo=ZoneInfo('localtime'))
-            #print(f"{self.date_str} ==> {date.isoformat()}")
-            return date
+            #print(f"{self.date_str} ==> {parse_date(self.date_str).isoformat()}")
+            return parse_date(self.date_str)
         else:
             return None
 
@@ -346,154 +541,159 @@ class Stb_pub(Bekendmaking):
         #print(f"Processing {metadata_link}", end = "\r")
 
     def add_info(self, metadata_link):
-        reponse = http.get(metadata_link)
-        soup = BeautifulSoup(reponse.content, 'xml')
-        dossier_links_list = soup.find_all("metadata", {"name" : "OVERHEIDop.behandeldDossier"})
-        for dossier_link in dossier_links_list:
-            self.dossier_links.append(dossier_link['content'])
+        meta = get_meta(metadata_link)
+        for dossier_link in meta.get("OVERHEIDop.behandeldDossier", []):
+            self.dossier_links.append(tuple(dossier_link.split(";"))) # parse once at ingest: (dossier_nr,) or (dossier_nr, ondernummer)
         self.nr = metadata_link.split("/")[-2]
         try:
-            self.title = soup.find("metadata", {"name" : "DC.title"})['content']
-            self.date_str = soup.find("metadata", {"name" : "DCTERMS.available"})['content']
-            self.organisatie = soup.find("metadata", {"name" : "DC.creator"})['content']
-        except TypeError:
+            self.title = meta["DC.title"][0]
+            self.date_str = meta["DCTERMS.available"][0]
+            self.organisatie = meta["DC.creator"][0]
+        except KeyError:
             pass
 
+def sru_search(query):
+    # pages through the SRU endpoint; returns the document nrs from the dcterms:identifier of every record
+    # replaces scraping 'resultaten?...&pagina=N' HTML pages, which transferred far more bytes and broke whenever the page layout changed
+    nrs = []
+    start_record = 1
+    number_of_records = 1
+    while start_record <= number_of_records:
+        response = http.get(f"{SRU_URL}?query={query}&maximumRecords={MAX_NUM_PER_PAGE}&startRecord={start_record}")
+        try:
+            for _, element in etree.iterparse(BytesIO(response.content), events=('end',)):
+                if not isinstance(element.tag, str): # skip comments/processing instructions
+                    continue
+                localname = etree.QName(element).localname
+                if localname == "numberOfRecords":
+                    number_of_records = int(element.text)
+                elif localname == "identifier" and element.text:
+                    nrs.append(element.text.rstrip("/").split("/")[-1].replace(".pdf", "").replace(".html", ""))
+                element.clear()
+        except etree.XMLSyntaxError:
+            logging.warning(f"Kan SRU-resultaat niet parsen voor query {query}")
+            break
+        start_record = start_record + MAX_NUM_PER_PAGE
+    return nrs
+
+def fetch_bijlage_meta(kst_nr):
+    time.sleep(FETCH_JITTER)
+    metafile_link = f"{OB_URL}{kst_nr}/metadata.xml"
+    #logging.info(f"Processing bijlage {metafile_link}")
+    meta = get_meta(metafile_link)
+    try:
+        bijlage_title = meta["DC.title"][0]
+        bijlage_dossiernummer = meta["OVERHEIDop.dossiernummer"][0]
+        bijlage_ondernummer = meta["OVERHEIDop.ondernummer"][0]
+    except KeyError:
+        logging.warning(f"Kan bijlage {metafile_link} niet verwerken, geen bijlage?")
+        return None
+    return kst_nr, bijlage_title, bijlage_dossiernummer, bijlage_ondernummer
+
+def fetch_kamerstuk(kst_nr):
+    time.sleep(FETCH_JITTER)
+    kst = Kamerstuk()
+    kst.add_info(f"{OB_URL}{kst_nr}/metadata.xml")
+    return kst
+
+def fetch_stb_pub(stb_nr):
+    time.sleep(FETCH_JITTER)
+    stb_pub = Stb_pub()
+    stb_pub.add_info(f"{OB_URL}{stb_nr}/metadata.xml")
+    return stb_pub
+
+@lru_cache(maxsize=None) # dossiers often share search terms; query each term once per run, not once per dossier
 def get_new_ksts(from_date, search_term, dossier_nr):
     new_ksts = set()
-    bijlagen_dict = {}
-    base_url = f"{OB_URL}resultaten?q=(c.product-area==\"officielepublicaties\")and(w.publicatienaam==\"Kamerstuk\")"
+    bijlagen_dict = defaultdict(lambda: defaultdict(list)) # {dossiernummer : {ondernummer : [{bijlage_nr : title}]}}
+    query = "(c.product-area==\"officielepublicaties\")and(w.publicatienaam==\"Kamerstuk\")"
     if from_date:
-        base_url = f"{base_url}and(dt.available>=\"{from_date.strftime('%Y-%m-%d')}\")"
+        query = f"{query}and(dt.available>=\"{from_date.strftime('%Y-%m-%d')}\")"
     elif search_term:
-        base_url = f"{base_url}and(cql.textAndIndexes=\"{search_term}\")"
+        query = f"{query}and(cql.textAndIndexes=\"{search_term}\")"
     elif dossier_nr:
-        base_url = f"{base_url}and(w.dossiernummer==\"{dossier_nr}\")"
-    pag_num = 1
-    max_page = 1
-    while pag_num <= max_page:
-        response = http.get(f"{base_url}&pg={MAX_NUM_PER_PAGE}&pagina={pag_num}")
-        response.encoding = 'UTF-8' # to fix encoding issues
-        soup = BeautifulSoup(response.text, 'html.parser')
-        try:
-            num = int(soup.find("span", {"class": "h1__sub"}).text.split(" ")[-2])
-        except AttributeError:
-            num = 0
-        #print(f"{base_url}&pg={MAX_NUM_PER_PAGE}&pagina={pag_num} gave {num} result(s)")
-        max_page = math.ceil(num / MAX_NUM_PER_PAGE) # round up
-        pag_num += 1
-        links = soup.find_all("a", {"class" : "icon icon--download", "data-nabs-follow" : "false"})
-        for link in links:
-            kst_nr = link["href"].replace(".pdf", "")
-            metafile_link = f"{OB_URL}{kst_nr}/metadata.xml"
-            if "b" in kst_nr: # ...so it should be treated as a bijlage...
-                #logging.info(f"Processing bijlage {metafile_link}")
-                bijlage_response = http.get(metafile_link)
-                #bijlage_response.encoding = 'UTF-8' # to fix decoding issues
-                bijlage_soup = BeautifulSoup(bijlage_response.content, 'xml')
-                try:
-                    bijlage_title = bijlage_soup.find("metadata", {"name" : "DC.title"})['content']
-                    bijlage_dossiernummer = bijlage_soup.find("metadata", {"name" : "OVERHEIDop.dossiernummer"})['content']
-                    bijlage_ondernummer = bijlage_soup.find("metadata", {"name" : "OVERHEIDop.ondernummer"})['content']
-                except TypeError:
-                    logging.warning(f"Kan bijlage {metafile_link} niet verwerken, geen bijlage?")
-                else:
-                    try: 
-                        bijlagen_dossier_dict = bijlagen_dict[bijlage_dossiernummer]
-                    except KeyError:
-                        bijlagen_dict[bijlage_dossiernummer] = {bijlage_ondernummer : [{kst_nr : bijlage_title}]}
-                    else:
-                        try:
-                            bijlagen_ondernummer_list = bijlagen_dossier_dict[bijlage_ondernummer]
-                        except KeyError:
-                            bijlagen_dossier_dict[bijlage_ondernummer] = [{kst_nr : bijlage_title}]
-                        else:
-                            bijlagen_ondernummer_list.append({kst_nr : bijlage_title})
-            elif "kst" in kst_nr: # should be a Kamerstuk
-                kst = Kamerstuk()
-                kst.add_info(metafile_link)
-                if kst.date_str: # if date_str == None, most likely the search results is no (valid) Kamerstuk...
-                    new_ksts.add(kst)
-                else:
-                    logging.warning(f"Ongeldig kamerstuk gevonden zonder datum in {metafile_link}")
-            else:
-                logging.warning(f"Onbekend documenttype gevonden zonder datum in {metafile_link}")
+        query = f"{query}and(w.dossiernummer==\"{dossier_nr}\")"
+    bijlage_nrs = []
+    kamerstuk_nrs = []
+    for kst_nr in set(sru_search(query)):
+        if "b" in kst_nr: # ...so it should be treated as a bijlage...
+            bijlage_nrs.append(kst_nr)
+        elif "kst" in kst_nr: # should be a Kamerstuk
+            kamerstuk_nrs.append(kst_nr)
+        else:
+            logging.warning(f"Onbekend documenttype gevonden zonder datum in {OB_URL}{kst_nr}/metadata.xml")
+    # fetch all metadata in parallel; merging the results stays on this thread
+    for bijlage_meta in FETCH_EXECUTOR.map(fetch_bijlage_meta, bijlage_nrs):
+        if bijlage_meta:
+            kst_nr, bijlage_title, bijlage_dossiernummer, bijlage_ondernummer = bijlage_meta
+            bijlagen_dict[bijlage_dossiernummer][bijlage_ondernummer].append({kst_nr : bijlage_title})
+    for kst_nr, kst in zip(kamerstuk_nrs, FETCH_EXECUTOR.map(fetch_kamerstuk, kamerstuk_nrs)):
+        if kst.date_str: # if date_str == None, most likely the search results is no (valid) Kamerstuk...
+            new_ksts.add(kst)
+        else:
+            logging.warning(f"Ongeldig kamerstuk gevonden zonder datum in {OB_URL}{kst_nr}/metadata.xml")
     # match bijlagen
     for kst in new_ksts:
         #logging.info(f"Try to add bijlagen to {kst.nr}")
-        try:
-            bijlagen_list = bijlagen_dict[kst.dossier_nr_string][kst.ondernummer_string]
-            #logging.info(f"bijlagen_list found with length {len(bijlagen_list)}")
-            for bijlage in bijlagen_list:
-                #logging.info(f"Added bijlage {bijlage}")
-                kst.bijlagen_dict |= bijlage # works since python 3.9
-        except KeyError:
-            pass
+        # .get instead of indexing, so misses don't materialize empty defaultdict entries
+        bijlagen_list = bijlagen_dict.get(kst.dossier_nr_string, {}).get(kst.ondernummer_string, [])
+        #logging.info(f"bijlagen_list found with length {len(bijlagen_list)}")
+        for bijlage in bijlagen_list:
+            #logging.info(f"Added bijlage {bijlage}")
+            kst.bijlagen_dict |= bijlage # works since python 3.9
     return new_ksts
 
 def get_new_stb_pubs(from_date, dossier_nr):
     new_stb_pubs = set()
-    base_url = f"{OB_URL}resultaten?q=(c.product-area==\"officielepublicaties\")and(w.publicatienaam==\"Staatsblad\")"
+    query = "(c.product-area==\"officielepublicaties\")and(w.publicatienaam==\"Staatsblad\")"
     if from_date:
-        base_url = f"{base_url}and(dt.available>=\"{from_date.strftime('%Y-%m-%d')}\")"
+        query = f"{query}and(dt.available>=\"{from_date.strftime('%Y-%m-%d')}\")"
     elif dossier_nr:
-        base_url = f"{base_url}and(cql.textAndIndexes=\"{dossier_nr}\")"
-    pag_num = 1
-    max_page = 1
-    while pag_num <= max_page:
-        response = http.get(f"{base_url}&pg={MAX_NUM_PER_PAGE}&pagina={pag_num}")
-        response.encoding = 'UTF-8' # to fix encoding issues
-        soup = BeautifulSoup(response.text, 'html.parser')
-        try:
-            num = int(soup.find("span", {"class": "h1__sub"}).text.split(" ")[-2])
-        except AttributeError:
-            num = 0
-        #print(f"{base_url}&pg={MAX_NUM_PER_PAGE}&pagina={pag_num} gave {num} result(s)")
-        max_page = math.ceil(num / MAX_NUM_PER_PAGE) # round up
-        pag_num += 1
-        links = soup.find_all("a", {"class" : "icon icon--download", "data-nabs-follow" : "false"})
-        for link in links:
-            stb_nr = link["href"].replace(".pdf", "")
-            metafile_link = f"{OB_URL}{stb_nr}/metadata.xml"
-            stb_pub = Stb_pub()
-            stb_pub.add_info(metafile_link)
-            if stb_pub.date_str: # if date_str == None, most likely the search results is no (valid) Staatsblad publication
-                new_stb_pubs.add(stb_pub)
+        query = f"{query}and(cql.textAndIndexes=\"{dossier_nr}\")"
+    stb_nrs = set(sru_search(query))
+    for stb_pub in FETCH_EXECUTOR.map(fetch_stb_pub, stb_nrs):
+        if stb_pub.date_str: # if date_str == None, most likely the search results is no (valid) Staatsblad publication
+            new_stb_pubs.add(stb_pub)
     return new_stb_pubs
 
 def add_data(dossier_info, kst):
-    response = http.get(f"{OB_URL}{kst.nr}/metadata.xml")
-    response.encoding = 'UTF-8' # to fix encoding issues
-    soup = BeautifulSoup(response.text, 'xml')
+    meta = get_meta(f"{OB_URL}{kst.nr}/metadata.xml")
     try:
-        dossier_info.title = soup.find("metadata", {"name" : "OVERHEIDop.dossiertitel"})["content"]
-    except TypeError:
+        dossier_info.title = meta["OVERHEIDop.dossiertitel"][0]
+    except KeyError:
         logging.warning(f"Geen titel gevonden voor dossier {dossier_info.nr} in {OB_URL}{kst.nr}/metadata.xml")
         
     # add date of most recent added item
-    response = http.get(url=f"{OB_URL}rss?q=(c.product-area==\"officielepublicaties\")and((w.publicatienaam==\"Kamerstuk\")and(w.dossiernummer==\"{dossier_info.nr}\"))")
-    response.encoding = 'UTF-8' # to fix encoding issues
-    soup = BeautifulSoup(response.text, 'xml')
+    soup = BeautifulSoup(conditional_get(f"{OB_URL}rss?q=(c.product-area==\"officielepublicaties\")and((w.publicatienaam==\"Kamerstuk\")and(w.dossiernummer==\"{dossier_info.nr}\"))"), 'xml')
     item = soup.find("item")
     if item:
-        dossier_info.last_date = datetime.datetime.strptime(str(item.find("pubDate").text), OB_DATE_STRING)
+        dossier_info.last_date = parsedate_to_datetime(str(item.find("pubDate").text)) # C-level RFC-822 parse, much faster than strptime
 
 def add_dossiers_info(dossiers_info, new_kst):
     if dossiers_info:
         added_dossier_info = False
+        dossier_info_by_nr = {item.nr : item for item in dossiers_info} # O(1) lookups instead of scanning the list for every kst
+        num_by_dossier = {} # successive kst often share a dossier; fetch the result count once per dossier per run
         for kst in new_kst:
-            dossier_nrs = kst.dossier_nr_string.split(";")
-            dossier_nr = dossier_nrs[0] # only process first dossier number
-            dossier_info = next((item for item in dossiers_info if item.nr == dossier_nr), None)
-            response = http.get(f"{OB_URL}resultaten?q=(c.product-area==\"officielepublicaties\")and(w.publicatienaam==\"Kamerstuk\")and(w.dossiernummer==\"{dossier_nr}\")")
-            response.encoding = 'UTF-8' # to fix encoding issues
-            soup = BeautifulSoup(response.text, 'html.parser')
-            try: 
-                num_string = soup.find("span", {"class": "h1__sub"}).text.split(" ")[-2]
-            except AttributeError:
-                logging.warning(f"0 search results for {OB_URL}resultaten?q=(c.product-area==\"officielepublicaties\")and(w.publicatienaam==\"Kamerstuk\")and(w.dossiernummer==\"{dossier_nr}\")")
-                num_string = "0"
-            
+            dossier_nr = kst.dossier_nrs[0] # only process first dossier number
+            dossier_info = dossier_info_by_nr.get(dossier_nr)
+            try:
+                num_string = num_by_dossier[dossier_nr]
+            except KeyError:
+                response = http.get(f"{OB_URL}resultaten?q=(c.product-area==\"officielepublicaties\")and(w.publicatienaam==\"Kamerstuk\")and(w.dossiernummer==\"{dossier_nr}\")")
+                response.encoding = 'UTF-8' # to fix encoding issues
+                match = H1_SUB_RE.search(response.text)
+                if match:
+                    num_string = match.group(1).split(" ")[-2]
+                else: # markup may have shifted; try a full parse before giving up
+                    soup = BeautifulSoup(response.text, 'html.parser')
+                    try:
+                        num_string = soup.find("span", {"class": "h1__sub"}).text.split(" ")[-2]
+                    except AttributeError:
+                        logging.warning(f"0 search results for {OB_URL}resultaten?q=(c.product-area==\"officielepublicaties\")and(w.publicatienaam==\"Kamerstuk\")and(w.dossiernummer==\"{dossier_nr}\")")
+                        num_string = "0"
+                num_by_dossier[dossier_nr] = num_string
+
             if not dossier_info: # new dossier item found that was not already there
                 dossier_info = Dossier_info(dossier_nr)
                 add_data(dossier_info, kst)
@@ -501,8 +701,8 @@ def add_dossiers_info(dossiers_info, new_kst):
                     dossier_info.num_items = num_string
                     dossier_info.last_date = kst.date
                     dossiers_info = [dossier_info, *dossiers_info]
-                    BOT.sendMessage(chat_id=CHAT_ID, text=f"New dossier number found: {dossier_nr} with title {dossier_info.title}")
-                    time.sleep(2) # Telegram does not like too many messages within a short timeframe
+                    dossier_info_by_nr[dossier_nr] = dossier_info
+                    notify(f"New dossier number found: {dossier_nr} with title {dossier_info.title}")
                     logging.info(f"New dossier number found: {dossier_nr} with title {dossier_info.title}")
                     added_dossier_info = True
             else: # existing dossier_info object found, update numer of items and date last addition
@@ -522,44 +722,35 @@ def add_dossiers_info(dossiers_info, new_kst):
             with open(f"{datetime.datetime.now().strftime('%Y-%m-%d_%H_%M_%S')}-dossieroverzicht.csv",'w', encoding='utf-8-sig') as csvfile:
                 csvwriter = csv.writer(csvfile, delimiter=';', dialect='excel', quotechar='"', quoting=csv.QUOTE_MINIMAL)
                 csvwriter.writerow(['nr', 'datum nieuwste stuk', 'aantal stukken', 'titel'])
-                for dossier in dossiers_info:
-                    csvwriter.writerow(dossier.get_result_list())
-        with open(INFO_PICKLE_FILE, 'wb') as info_pickle: # write pickle anyway (regardless if there were additions/changes or not)
-            pickle.dump(dossiers_info, info_pickle, protocol=pickle.HIGHEST_PROTOCOL)
+                csvwriter.writerows(dossier.get_result_list() for dossier in dossiers_info) # one writerows call keeps the loop inside the csv module
+            dump_pickle(dossiers_info, INFO_PICKLE_FILE) # only rewrite the pickle when something was added/modified; a no-change run leaves it untouched
 
 def add_initial_dossier_info_data(dossier_info):
     # add title and num_items
-    response = http.get(f"{REP_URL}{dossier_info.nr}/?format=xml")
-    response.encoding = 'UTF-8' # to fix encoding issues
-    soup = BeautifulSoup(response.text, 'xml')
+    soup = BeautifulSoup(conditional_get(f"{REP_URL}{dossier_info.nr}/?format=xml"), 'xml')
     try:
         dossier_info.num_items = soup.find("subarea", {"label" : dossier_info.nr})["total"]
     except TypeError:
         #print(f"Geen aantal stukken gevonden voor dossier {dossier_info.nr}")
         logging.warning(f"Geen aantal stukken gevonden voor dossier {dossier_info.nr}")
-        logging.warning(f"Status code: {response.status_code}; content:")
         logging.warning(soup.prettify())
     works = soup.find_all("work")
     for work in works:
-        response = http.get(f"{REP_URL}{dossier_info.nr}/{work.text}/1/metadata/metadata.xml")
-        response.encoding = 'UTF-8' # to fix encoding issues
-        soup = BeautifulSoup(response.text, 'xml')
+        meta = get_meta(f"{REP_URL}{dossier_info.nr}/{work.text}/1/metadata/metadata.xml")
         try:
-            dossier_info.title = soup.find("metadata", {"name" : "OVERHEIDop.dossiertitel"})["content"]
+            dossier_info.title = meta["OVERHEIDop.dossiertitel"][0]
             break
-        except TypeError:
+        except KeyError:
             pass
     if not dossier_info.title:
         #print(f"Geen titel gevonden voor dossier {dossier_info.nr}")
         logging.warning(f"Geen titel gevonden voor dossier {dossier_info.nr}")
         
     # add date of most recent added item
-    response = http.get(url=f"{OB_URL}rss?q=(c.product-area==\"officielepublicaties\")and((w.publicatienaam==\"Kamerstuk\")and(w.dossiernummer==\"{dossier_info.nr}\"))")
-    response.encoding = 'UTF-8' # to fix encoding issues
-    soup = BeautifulSoup(response.text, 'xml')
+    soup = BeautifulSoup(conditional_get(f"{OB_URL}rss?q=(c.product-area==\"officielepublicaties\")and((w.publicatienaam==\"Kamerstuk\")and(w.dossiernummer==\"{dossier_info.nr}\"))"), 'xml')
     item = soup.find("item")
     if item:
-        dossier_info.last_date = datetime.datetime.strptime(str(item.find("pubDate").text), OB_DATE_STRING)
+        dossier_info.last_date = parsedate_to_datetime(str(item.find("pubDate").text)) # C-level RFC-822 parse, much faster than strptime
 
 def get_initial_dossiers_info():
     dossiers_info = []
@@ -592,83 +783,107 @@ def get_initial_dossiers_info():
 
 def main():
 
-    config_json = open(CONFIG_FILE)
-    config_data = json.load(config_json)
+    with open(CONFIG_FILE) as config_json:
+        config_data = json.load(config_json)
+
+    os.makedirs(RESULTSDIR, exist_ok=True) # create once here, so the per-dossier loop only makes its own subdirectory
 
     try:
-        with open(INFO_PICKLE_FILE, 'rb') as info_pickle:
-            dossiers_info = pickle.load(info_pickle)
+        dossiers_info = load_pickle(INFO_PICKLE_FILE)
         #print(f"Loaded info of {len(dossiers_info)} dossiers")
         info_date = datetime.datetime.fromtimestamp(os.path.getmtime(INFO_PICKLE_FILE))
-    except (FileNotFoundError, EOFError) as e:
+    except (FileNotFoundError, EOFError, zstd.ZstdError) as e: # ZstdError: pre-zstd or corrupt pickle; rebuild it
+        info_date = None
         dossiers_info = get_initial_dossiers_info()
+    # one shard per dossier: a run that changes nothing rewrites nothing, instead of re-serializing everything
+    dossiers = []
+    shard_mtimes = []
     try:
-        with open(STUKKEN_PICKLE_FILE, 'rb') as stukken_pickle:
-            dossiers = pickle.load(stukken_pickle)
-        #print(f"Loaded {len(dossiers)} dossiers")
-        stukken_date = datetime.datetime.fromtimestamp(os.path.getmtime(STUKKEN_PICKLE_FILE))
-        if dossiers_info:
-            from_date = min([stukken_date, info_date]) # oldest of these two dates
-        else:
-            from_date = stukken_date
+        shards = sorted(os.listdir(STUKKEN_PICKLE_DIR))
+    except FileNotFoundError:
+        shards = []
+    for shard in shards:
+        if shard.endswith(".pkl"):
+            try:
+                dossiers.append(load_pickle(f"{STUKKEN_PICKLE_DIR}{shard}"))
+                shard_mtimes.append(os.path.getmtime(f"{STUKKEN_PICKLE_DIR}{shard}"))
+            except (EOFError, zstd.ZstdError):
+                logging.warning(f"Kan {shard} niet laden; dossier wordt opnieuw opgebouwd")
+    #print(f"Loaded {len(dossiers)} dossiers")
+    if dossiers:
+        try:
+            # the stamp marks the end of the previous full run (stukken and dossier info both processed),
+            # so it alone bounds the search window; the info pickle's mtime no longer moves on no-change runs
+            from_date = datetime.datetime.fromtimestamp(os.path.getmtime(LAST_RUN_FILE))
+        except FileNotFoundError: # no stamp yet (first run with shards); fall back to the oldest file we wrote
+            from_date = datetime.datetime.fromtimestamp(min(shard_mtimes))
+            if info_date:
+                from_date = min([from_date, info_date]) # oldest of these two dates
         #print(f"Previous run time was {from_date.isoformat()}")
         logging.info(f"Previous run time was {from_date.isoformat()}")
-        new_kst = get_new_ksts(from_date, None, None)
+        new_kst = set(get_new_ksts(from_date, None, None)) # copy: |= below must not grow the cached result
         add_dossiers_info(dossiers_info, new_kst)
         new_stb_pubs = get_new_stb_pubs(from_date, None)
-    except (FileNotFoundError, EOFError) as e:
-        dossiers = []
-        new_obs = set()
-        
-    for dossier in dossiers: # clean old dossiers from pickle that are no longer in config file
-        config_dossier = next((item for item in config_data if item['DOSSIER_NR'] == int(dossier.nr)), None)
-        if not config_dossier:
+
+    
+    # clean old dossiers from pickle that are no longer in config file
+    # (don't remove() while iterating: that skips entries and is O(N^2))
+    wanted_nrs = {str(config_dossier['DOSSIER_NR']) for config_dossier in config_data}
+    for dossier in dossiers:
+        if dossier.nr not in wanted_nrs:
             logging.info(f"Removing {dossier.nr} from dossiers (no longer in {CONFIG_FILE}")
-            dossiers.remove(dossier)
+            try:
+                os.remove(f"{STUKKEN_PICKLE_DIR}{dossier.nr}.pkl")
+            except FileNotFoundError:
+                pass
+    dossiers = [dossier for dossier in dossiers if dossier.nr in wanted_nrs]
+    dossiers_by_nr = {item.nr : item for item in dossiers} # O(1) lookups instead of scanning the list for every config entry
     for config_dossier in config_data:
         dossier_nr = str(config_dossier['DOSSIER_NR'])
-        dossier = next((item for item in dossiers if item.nr == dossier_nr), None)
+        dossier = dossiers_by_nr.get(dossier_nr)
         if not dossier: # new dossier; in json but not in pickle ==> get everything!
             #print(end=LINE_CLEAR)
             #print(f"New dossier in {CONFIG_FILE}: {dossier_nr}")
             logging.info(f"New dossier in {CONFIG_FILE}: {dossier_nr}")
             dossier = Dossier(dossier_nr, config_dossier['ZOEKTERMEN'])
-            dossier.add_rep_kamerstukken()
-            for kst in dossier.obs:
-                kst.add_bijlagen_titles()
-            additional_kst = get_new_ksts(None, None, dossier_nr)
-            for config_search_term in dossier.search_terms: 
-                additional_kst |= get_new_ksts(None, config_search_term, None)
-            for kst in additional_kst:
-                if dossier_nr in kst.dossier_nr_string:
-                    kst.add_bijlagen_titles()
-                    dossier.obs.add(kst)
+            dossier.add_rep_kamerstukken() # fetches the bijlagen titles per kamerstuk too (fused in _fetch_kst)
+            additional_kst = get_new_ksts(None, None, dossier_nr).union(*(get_new_ksts(None, config_search_term, None) for config_search_term in dossier.search_terms))
+            # obs is keyed by nr, so the dedup check is a plain dict lookup instead of hashing whole objects
+            matching_kst = [kst for kst in additional_kst if dossier_nr in kst.dossier_nrs and kst.nr not in dossier.obs]
+            # these came from the search results, not from _fetch_kst, so their titles still need
+            # fetching; fan out across kamerstukken (small pool: add_bijlagen_titles fans out itself)
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(lambda kst: kst.add_bijlagen_titles(), matching_kst))
+            for kst in matching_kst:
+                dossier.obs[kst.nr] = kst
             additional_stb_pubs = get_new_stb_pubs(None, dossier_nr)
             for stb_pub in additional_stb_pubs:
-                add_as_kamerstuk = False
-                for dossier_link_string in stb_pub.dossier_links:
-                    dossier_link = dossier_link_string.split(";")
-                    if dossier_link[0] == dossier_nr:
-                        add_as_kamerstuk = True
-                        if len(dossier_link) == 2:
-                            link_kamerstuk_nr = f"kst-{dossier_link[0]}-{dossier_link[1]}"
-                            kamerstuk = next((item for item in dossier.obs if item.nr == link_kamerstuk_nr), None)
-                            if kamerstuk:
-                                kamerstuk.bijlagen_dict[stb_pub.nr] = stb_pub.title
-                                add_as_kamerstuk = False
+                matching_links = [link for link in stb_pub.dossier_links if link[0] == dossier_nr] # links are pre-split tuples (see Stb_pub.add_info)
+                add_as_kamerstuk = bool(matching_links)
+                for dossier_link in matching_links:
+                    if len(dossier_link) == 2:
+                        kamerstuk = dossier.obs.get(f"kst-{dossier_link[0]}-{dossier_link[1]}") # obs is keyed by nr, so this is O(1)
+                        if kamerstuk:
+                            kamerstuk.bijlagen_dict[stb_pub.nr] = stb_pub.title
+                            add_as_kamerstuk = False
+                            break # attached to its kamerstuk; no need to scan the remaining links
                 if add_as_kamerstuk and stb_pub.date_str: # if Staatsblad publication could no be linked to specific Kamerstuk(ken), but a link to the dossier is present; then add as if it where a kamerstuk
-                    dossier.obs.add(stb_pub)
+                    dossier.obs[stb_pub.nr] = stb_pub
             
-            try:
-                os.mkdir(f"{RESULTSDIR}{dossier_nr}")
-            except FileExistsError:
-                pass
+            os.makedirs(f"{RESULTSDIR}{dossier_nr}", exist_ok=True)
             
-            for ob in dossier.obs:
-                ob.dowload_all(dossier_nr)
+            # downloads for different stukken can overlap as well; dowload_all itself limits the
+            # per-stuk fan-out, so keep this outer pool small to stay under the server's radar
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(lambda ob: ob.dowload_all(dossier_nr), dossier.obs.values()))
             dossier.write_html()
-            
+            # archive the completed dossier right away, so incremental runs only have to add to it;
+            # the loose files stay as the working copy for those incremental updates
+            archive_dossier(dossier.nr)
+
             dossiers.append(dossier)
+            dossiers_by_nr[dossier_nr] = dossier
+            dump_dossier(dossier)
         else: # existing dossier; in json and in pickle ==> get only updates
             additions = False
             #print(end=LINE_CLEAR)
@@ -682,55 +897,50 @@ def main():
             #print(f"{len(additional_kst)} additional_ksts")
             for kst in new_kst:
                 #print(kst.dossier_nr_string)
-                if dossier_nr in kst.dossier_nr_string and kst not in dossier.obs:
+                if dossier_nr in kst.dossier_nrs and kst.nr not in dossier.obs:
                     additions = True
                     kst.add_bijlagen_titles()
-                    dossier.obs.add(kst)
+                    dossier.obs[kst.nr] = kst
                     kst.dowload_all(dossier_nr)
-                    BOT.sendMessage(chat_id=CHAT_ID, text=f"New kamerstuk for dossier {dossier_nr}: {OB_URL}{kst.nr}.pdf")
-                    time.sleep(2) # Telegram does not like too many messages within a short timeframe
+                    notify(f"New kamerstuk for dossier {dossier_nr}: {OB_URL}{kst.nr}.pdf")
                     #print(end=LINE_CLEAR)
                     #print(f"New kamerstuk for dossier {dossier_nr}: {kst.nr}")
                     logging.info(f"New kamerstuk for dossier {dossier_nr}: {kst.nr}")
 
             for stb_pub in new_stb_pubs:
-                add_as_kamerstuk = False
-                for dossier_link_string in stb_pub.dossier_links:
-                    dossier_link = dossier_link_string.split(";")
-                    if dossier_link[0] == dossier_nr:
-                        add_as_kamerstuk = True
-                        if len(dossier_link) == 2:
-                            link_kamerstuk_nr = f"kst-{dossier_link[0]}-{dossier_link[1]}"
-                            kamerstuk = next((item for item in dossier.obs if item.nr == link_kamerstuk_nr), None)
-                            if kamerstuk and not stb_pub.nr in kamerstuk.bijlagen_dict:
-                                additions = True
-                                kamerstuk.bijlagen_dict[stb_pub.nr] = stb_pub.title
-                                stb_pub.download_file(stb_pub.nr, f"{kamerstuk.date_str}-{kamerstuk.nr}-{stb_pub.nr}.pdf", dossier_nr)
-                                BOT.sendMessage(chat_id=CHAT_ID, text=f"New Staatsblad publication for dossier {dossier_nr}: {OB_URL}{stb_pub.nr}.pdf")
-                                time.sleep(2) # Telegram does not like too many messages within a short timeframe
-                                #print(end=LINE_CLEAR)
-                                #print(f"New Staatsblad publication for dossier {dossier_nr}: {stb_pub.nr}")
-                                logging.info(f"New Staatsblad publication for dossier {dossier_nr}: {stb_pub.nr}")
-                                add_as_kamerstuk = False
-                if add_as_kamerstuk and stb_pub.date_str and stb_pub not in dossier.obs: # if Staatsblad publication could no be linked to specific Kamerstuk(ken), but a link to the dossier is present; then add as if it where a kamerstuk
+                matching_links = [link for link in stb_pub.dossier_links if link[0] == dossier_nr] # links are pre-split tuples (see Stb_pub.add_info)
+                add_as_kamerstuk = bool(matching_links)
+                for dossier_link in matching_links:
+                    if len(dossier_link) == 2:
+                        kamerstuk = dossier.obs.get(f"kst-{dossier_link[0]}-{dossier_link[1]}") # obs is keyed by nr, so this is O(1)
+                        if kamerstuk and not stb_pub.nr in kamerstuk.bijlagen_dict:
+                            additions = True
+                            kamerstuk.bijlagen_dict[stb_pub.nr] = stb_pub.title
+                            stb_pub.download_file(stb_pub.nr, f"{kamerstuk.date_str}-{kamerstuk.nr}-{stb_pub.nr}.pdf", dossier_nr)
+                            notify(f"New Staatsblad publication for dossier {dossier_nr}: {OB_URL}{stb_pub.nr}.pdf")
+                            #print(end=LINE_CLEAR)
+                            #print(f"New Staatsblad publication for dossier {dossier_nr}: {stb_pub.nr}")
+                            logging.info(f"New Staatsblad publication for dossier {dossier_nr}: {stb_pub.nr}")
+                            add_as_kamerstuk = False
+                            break # attached to its kamerstuk; no need to scan the remaining links
+                if add_as_kamerstuk and stb_pub.date_str and stb_pub.nr not in dossier.obs: # if Staatsblad publication could no be linked to specific Kamerstuk(ken), but a link to the dossier is present; then add as if it where a kamerstuk
                     additions = True
-                    dossier.obs.add(stb_pub)
+                    dossier.obs[stb_pub.nr] = stb_pub
                     stb_pub.download_file(stb_pub.nr, f"{stb_pub.date_str}-{stb_pub.nr}.pdf", dossier_nr)
-                    BOT.sendMessage(chat_id=CHAT_ID, text=f"New Staatsblad publication for dossier {dossier_nr}: {OB_URL}{stb_pub.nr}.pdf")
-                    time.sleep(2) # Telegram does not like too many messages within a short timeframe
+                    notify(f"New Staatsblad publication for dossier {dossier_nr}: {OB_URL}{stb_pub.nr}.pdf")
                     #print(end=LINE_CLEAR)
                     #print(f"New Staatsblad publication for dossier {dossier_nr}: {stb_pub.nr}")
                     logging.info(f"New Staatsblad publication for dossier {dossier_nr}: {stb_pub.nr}")
             
             if additions:
                 dossier.write_html()
-                with py7zr.SevenZipFile(f"{RESULTSDIR}{dossier.nr}.7z", 'w') as archive:
-                    archive.writeall(f"{RESULTSDIR}{dossier.nr}/")
+                dump_dossier(dossier)
+                archive_dossier(dossier.nr)
     
-    #print(end=LINE_CLEAR)
-    #print(f"Number of dossiers to write to {STUKKEN_PICKLE_FILE}: {len(dossiers)}")
-    with open(STUKKEN_PICKLE_FILE, 'wb') as stukken_pickle:
-        pickle.dump(dossiers, stukken_pickle, protocol=pickle.HIGHEST_PROTOCOL)
+    notify_q.join() # let the notifier drain before exiting (it is a daemon thread)
+    with open(LAST_RUN_FILE, 'w'):
+        pass # only the mtime matters
+    save_etags()
 
 if __name__ == "__main__":
     main()